@@ -0,0 +1,179 @@
+"""
+Asyncio rendering API for CASER Profile Builder.
+Awaitable renders that run in a process pool without blocking the loop.
+
+Usage:
+    async with AsyncRenderer(max_concurrency=4) as renderer:
+        pdf = await renderer.render(profile)
+        async for outcome in renderer.render_many(jobs):
+            ...
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
+import logging
+
+import metrics
+from pdf_generator import PDFGenerator
+from profile_io import load_profile, atomic_write
+from profile_model import Profile
+
+logger = logging.getLogger(__name__)
+
+
+def render_to_target(source, output_path=None):
+    """
+    Worker job: renders profile to a file or to bytes.
+
+    Args:
+        source (str or Profile): Profile JSON path or profile
+        output_path (str): Where to write the PDF atomically; None for bytes
+
+    Returns:
+        str or bytes: output_path, or the PDF itself
+    """
+    profile = load_profile(source) if isinstance(source, str) else source
+    if output_path is None:
+        return PDFGenerator.create_profile_pdf_bytes(profile)
+    with atomic_write(output_path) as f:
+        PDFGenerator.create_profile_pdf(profile, f)
+    return output_path
+
+
+class AsyncRenderer:
+    """Renders profiles from asyncio code with bounded concurrency."""
+
+    def __init__(self, max_concurrency=None, executor=None):
+        """
+        Args:
+            max_concurrency (int): Renders running at once (default: CPU count)
+            executor (Executor): Process pool to use; by default one with
+                max_concurrency workers is created and owned by the renderer
+        """
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self._own_executor = executor is None
+        self._executor = executor
+        self._semaphore = None
+        # Jobs inside render(), waiting for a slot or running
+        self._pending = 0
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_concurrency)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def render(self, source, output_path=None):
+        """
+        Renders one profile.
+
+        Jobs wait for a free slot in the event loop, not in the executor
+        queue, so cancelling a waiting job means it never starts. A job
+        that already runs in a worker finishes there and its result is
+        dropped.
+
+        Args:
+            source (str, Profile or dict): Profile JSON path or profile
+            output_path (str): Where to write the PDF; None returns bytes
+
+        Returns:
+            str or bytes: output_path, or the PDF itself
+        """
+        if not isinstance(source, str):
+            source = Profile.coerce(source)
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+
+        self._pending += 1
+        metrics.QUEUE_DEPTH.set(self._pending, pool="async")
+        try:
+            async with self._semaphore:
+                outcome = await loop.run_in_executor(
+                    self._executor, metrics.run_measured,
+                    render_to_target, source, output_path
+                )
+        finally:
+            self._pending -= 1
+            metrics.QUEUE_DEPTH.set(self._pending, pool="async")
+        return metrics.unwrap_measured(outcome)
+
+    async def render_many(self, jobs):
+        """
+        Renders jobs and yields outcomes in completion order.
+
+        Jobs are taken from the (sync or async) iterable only as slots
+        free up, so memory stays bounded for long job streams. Closing
+        the iterator or cancelling the consumer cancels pending jobs.
+
+        Args:
+            jobs (iterable or async iterable): (key, source, output_path)
+                tuples; output_path may be None to get bytes
+
+        Yields:
+            dict: {"key": key, "result": path or bytes, "error": exception or None}
+        """
+        iterator = _aiter(jobs)
+        window = 2 * self.max_concurrency
+        tasks = {}
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and len(tasks) < window:
+                    try:
+                        key, source, output_path = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    task = asyncio.ensure_future(self.render(source, output_path))
+                    tasks[task] = key
+                if not tasks:
+                    return
+
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = tasks.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        logger.error(f"Failed to render {key}: {error}")
+                    yield {
+                        "key": key,
+                        "result": None if error is not None else task.result(),
+                        "error": error,
+                    }
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            await iterator.aclose()
+
+    async def close(self):
+        """Waits for running jobs and shuts down the owned executor."""
+        if self._executor is not None and self._own_executor:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    async def __aenter__(self):
+        self._ensure_started()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+async def _aiter(iterable):
+    """Async iterator over a sync or async iterable."""
+    if hasattr(iterable, "__aiter__"):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+async def render_pdf_async(source, output_path=None):
+    """Simplified coroutine for rendering one PDF (uses a short-lived pool)."""
+    async with AsyncRenderer(max_concurrency=1) as renderer:
+        return await renderer.render(source, output_path)
@@ -0,0 +1,386 @@
+"""
+Guarded batch rendering for CASER Profile Builder.
+Runs each profile with a wall-clock timeout and memory/pixel budgets.
+
+A job that exceeds its budget has its worker process killed and replaced;
+the job is retried with degraded settings (photos dropped, then long text
+truncated) and recorded as failed if every attempt fails.
+
+Usage:
+    python guarded_render.py OUTPUT_DIR profile1.json profile2.json ...
+"""
+
+from multiprocessing.connection import wait
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import warnings
+import logging
+
+import metrics
+from pdf_generator import PDFGenerator
+from profile_io import load_profile, atomic_write, remove_stale_temps
+from profile_model import Profile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_RSS_MB = 1024
+DEFAULT_MAX_IMAGE_PIXELS = 40_000_000
+DEGRADED_TEXT_LIMIT = 20_000
+TEXT_FIELDS = ("biography", "notes", "additional_info")
+
+# Degradation levels tried in order
+LEVEL_FULL = 0
+LEVEL_NO_PHOTOS = 1
+LEVEL_TRUNCATED_TEXT = 2
+LEVEL_NAMES = {
+    LEVEL_FULL: "full",
+    LEVEL_NO_PHOTOS: "no_photos",
+    LEVEL_TRUNCATED_TEXT: "truncated_text",
+}
+
+_MONITOR_INTERVAL = 0.2
+
+
+def degrade_profile(profile, level):
+    """
+    Returns copy of profile reduced for given degradation level.
+
+    Args:
+        profile (Profile): Profile
+        level (int): LEVEL_* constant
+    """
+    changes = {}
+    if level >= LEVEL_NO_PHOTOS:
+        changes["photos"] = ()
+    if level >= LEVEL_TRUNCATED_TEXT:
+        for field in TEXT_FIELDS:
+            value = getattr(profile, field)
+            if len(value) > DEGRADED_TEXT_LIMIT:
+                changes[field] = value[:DEGRADED_TEXT_LIMIT] + " [...truncated]"
+    return profile.replace(**changes) if changes else profile
+
+
+class InputError(Exception):
+    """Profile could not be read; retrying with degraded settings won't help."""
+
+
+def _render_job(source, output_path, level):
+    """Loads, degrades and renders one profile inside worker."""
+    try:
+        profile = load_profile(source) if isinstance(source, str) else Profile.coerce(source)
+    except Exception as e:
+        raise InputError(f"{type(e).__name__}: {e}") from e
+    profile = degrade_profile(profile, level)
+    with atomic_write(output_path) as f:
+        # An oversized photo fails the attempt, so it is logged and retried without photos
+        PDFGenerator.create_profile_pdf(profile, f, strict_photos=True)
+    return output_path
+
+
+def _apply_worker_limits(max_rss_mb, max_image_pixels):
+    """Sets process-wide limits in a fresh worker."""
+    from PIL import Image as PilImage
+
+    # Oversized images raise instead of being decoded
+    PilImage.MAX_IMAGE_PIXELS = max_image_pixels
+    warnings.simplefilter("error", PilImage.DecompressionBombWarning)
+
+    try:
+        import resource
+    except ImportError:
+        return  # Windows: the parent's RSS monitor and timeout still apply
+
+    # Hard backstop well above the RSS budget; the parent enforces the budget
+    limit = max_rss_mb * 1024 * 1024 * 4
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError) as e:
+        logger.debug(f"Cannot set address space limit: {e}")
+
+
+def _worker_main(conn, max_rss_mb, max_image_pixels):
+    """Worker loop: receives jobs, sends back outcome and metrics."""
+    _apply_worker_limits(max_rss_mb, max_image_pixels)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        job_id, source, output_path, level = job
+        result, error, measured = metrics.run_measured(_render_job, source, output_path, level)
+        retryable = not isinstance(error, InputError)
+        if error is None:
+            message = None
+        else:
+            message = f"{type(error).__name__}: {error}" if retryable else str(error)
+        conn.send((job_id, message, retryable, measured))
+        if isinstance(error, MemoryError):
+            return  # heap may be fragmented; let the supervisor start a fresh one
+
+
+def _rss_bytes(pid):
+    """Resident memory of a process (Linux only, else None)."""
+    try:
+        with open(f"/proc/{pid}/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _Worker:
+    """One supervised worker process."""
+
+    def __init__(self, ctx, max_rss_mb, max_image_pixels):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, max_rss_mb, max_image_pixels),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.job = None
+        self.deadline = None
+
+    def assign(self, job, timeout):
+        job_id, source, output_path, level, attempt = job
+        self.conn.send((job_id, source, output_path, level))
+        self.job = job
+        self.deadline = time.monotonic() + timeout
+
+    def kill(self):
+        """Kills worker and removes the half-written output of its job."""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        if self.job is not None:
+            remove_stale_temps(self.job[2])
+            self.job = None
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class GuardedRenderer:
+    """Renders profiles in isolated workers with per-job budgets."""
+
+    def __init__(self, workers=None, timeout=DEFAULT_TIMEOUT,
+                 max_rss_mb=DEFAULT_MAX_RSS_MB,
+                 max_image_pixels=DEFAULT_MAX_IMAGE_PIXELS,
+                 max_level=LEVEL_TRUNCATED_TEXT, failure_log=None):
+        """
+        Args:
+            workers (int): Worker processes (default: CPU count)
+            timeout (float): Wall-clock seconds per attempt
+            max_rss_mb (int): Resident memory budget per worker
+            max_image_pixels (int): Largest photo (width * height) decoded
+            max_level (int): Highest degradation level to retry with
+            failure_log (str): JSON-lines file receiving failed attempts
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.max_image_pixels = max_image_pixels
+        self.max_level = max_level
+        self.failure_log = failure_log
+        self._ctx = multiprocessing.get_context()
+
+    def render_many(self, jobs):
+        """
+        Renders jobs and yields their outcome in completion order.
+
+        Args:
+            jobs (iterable): (job_id, source, output_path) tuples; source is
+                a profile JSON path, Profile or profile dict
+
+        Yields:
+            dict: job_id, output, status ("ok", "degraded" or "failed"),
+                level, attempts, errors
+        """
+        # Dicts are validated in the worker, so a bad one fails only its own job
+        queue = [(job_id, source, output_path, LEVEL_FULL, 1)
+                 for job_id, source, output_path in jobs]
+        queue.reverse()
+        errors = {}
+        workers = []
+        try:
+            while queue or any(w.job for w in workers):
+                while queue and len(workers) < self.workers:
+                    workers.append(self._spawn())
+                for worker in workers:
+                    if worker.job is None and queue:
+                        worker.assign(queue.pop(), self.timeout)
+                busy = sum(1 for w in workers if w.job is not None)
+                metrics.QUEUE_DEPTH.set(len(queue) + busy, pool="guarded")
+
+                for outcome in self._wait(workers):
+                    job, error, retryable = outcome
+                    job_id, source, output_path, level, attempt = job
+                    if error is None:
+                        yield self._result(job, "ok" if level == LEVEL_FULL else "degraded",
+                                           errors.pop(job_id, []))
+                        continue
+
+                    errors.setdefault(job_id, []).append(f"{LEVEL_NAMES[level]}: {error}")
+                    self._log_failure(job_id, level, attempt, error)
+                    if retryable and level < self.max_level:
+                        logger.warning(f"Job {job_id} failed ({error}); retrying degraded")
+                        queue.append((job_id, source, output_path, level + 1, attempt + 1))
+                    else:
+                        metrics.JOB_FAILURES.inc(pool="guarded")
+                        logger.error(f"Job {job_id} failed after {attempt} attempts")
+                        yield self._result(job, "failed", errors.pop(job_id, []))
+        finally:
+            for worker in workers:
+                if worker.job is not None:
+                    worker.kill()
+                else:
+                    worker.stop()
+            metrics.QUEUE_DEPTH.set(0, pool="guarded")
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.max_rss_mb, self.max_image_pixels)
+
+    def _wait(self, workers):
+        """
+        Waits for results, enforcing time and memory budgets.
+
+        Returns:
+            list: (job, error message or None, retryable) for finished attempts
+        """
+        busy = [w for w in workers if w.job is not None]
+        if not busy:
+            return []
+        nearest = min(w.deadline for w in busy)
+        timeout = max(0.0, min(nearest - time.monotonic(), _MONITOR_INTERVAL))
+        ready = wait([w.conn for w in busy] + [w.process.sentinel for w in busy], timeout)
+
+        finished = []
+        now = time.monotonic()
+        for worker in busy:
+            error = None
+            if worker.conn in ready:
+                try:
+                    job_id, error, retryable, measured = worker.conn.recv()
+                    metrics.unwrap_measured((None, None, measured))
+                    finished.append((worker.job, error, retryable))
+                    worker.job = None
+                    if error and error.startswith("MemoryError"):
+                        # The worker exits after MemoryError; replace it now
+                        worker.stop()
+                        workers[workers.index(worker)] = self._spawn()
+                    continue
+                except (EOFError, OSError):
+                    error = f"worker exited (code {worker.process.exitcode})"
+            elif worker.process.sentinel in ready:
+                worker.process.join()
+                error = f"worker exited (code {worker.process.exitcode})"
+            elif now >= worker.deadline:
+                error = f"timeout after {self.timeout:.0f}s"
+            else:
+                rss = _rss_bytes(worker.process.pid)
+                if rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+                    error = f"memory budget exceeded ({rss // (1024 * 1024)} MB)"
+            if error is None:
+                continue
+
+            finished.append((worker.job, error, True))
+            worker.kill()
+            workers[workers.index(worker)] = self._spawn()
+
+        return finished
+
+    def _result(self, job, status, errors):
+        job_id, source, output_path, level, attempt = job
+        return {
+            "job_id": job_id,
+            "output": output_path if status != "failed" else None,
+            "status": status,
+            "level": LEVEL_NAMES[level],
+            "attempts": attempt,
+            "errors": errors,
+        }
+
+    def _log_failure(self, job_id, level, attempt, error):
+        """Appends failed attempt to failure log."""
+        if not self.failure_log:
+            return
+        record = {
+            "job_id": str(job_id),
+            "level": LEVEL_NAMES[level],
+            "attempt": attempt,
+            "error": error,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        try:
+            with open(self.failure_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.warning(f"Cannot write failure log {self.failure_log}: {e}")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Render profiles with per-job time and memory budgets.")
+    parser.add_argument("output_dir")
+    parser.add_argument("profiles", nargs="+", help="profile JSON files")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--max-rss-mb", type=int, default=DEFAULT_MAX_RSS_MB)
+    parser.add_argument("--max-image-pixels", type=int, default=DEFAULT_MAX_IMAGE_PIXELS)
+    parser.add_argument("--failure-log", default=None, help="JSON-lines file for failed attempts")
+    parser.add_argument("--metrics-file", default=None, help="write Prometheus metrics to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [
+        (path, path, os.path.join(
+            args.output_dir, os.path.splitext(os.path.basename(path))[0] + ".pdf"
+        ))
+        for path in args.profiles
+    ]
+    renderer = GuardedRenderer(
+        workers=args.workers,
+        timeout=args.timeout,
+        max_rss_mb=args.max_rss_mb,
+        max_image_pixels=args.max_image_pixels,
+        failure_log=args.failure_log
+    )
+
+    failed = 0
+    for result in renderer.render_many(jobs):
+        if result["status"] == "failed":
+            failed += 1
+        logger.info(f"{result['job_id']}: {result['status']} ({result['level']})")
+
+    if args.metrics_file:
+        metrics.write_metrics_file(args.metrics_file)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
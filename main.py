@@ -17,6 +17,10 @@ import logging
 from datetime import datetime
 import sys
 
+from profile_io import generate_filename
+from profile_model import Profile
+from text_flow import escape_text, iter_text_flowables
+
 
 
 logging.basicConfig(
@@ -473,43 +477,31 @@ class App(ctk.CTk):
     
     def _collect_profile_data(self):
         """DATA"""
-        data = {
-            "full_name": self.entries["full_name"].get().strip(),
-            "date_of_birth": self.entries["date_of_birth"].get().strip(),
-            "position": self.entries["position"].get().strip(),
-            "tags": self.entries["tags"].get().strip(),
-            "biography": self.bio_text.get("1.0", "end-1c").strip(),
-            "notes": self.notes_text.get("1.0", "end-1c").strip(),
-            "contacts": self.contacts.copy(),
-            "photos": self.photos.copy(),
-            "additional_info": self.custom_text.get("1.0", "end-1c").strip(),
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "app_version": VERSION
-        }
+        data = Profile(
+            full_name=self.entries["full_name"].get().strip(),
+            date_of_birth=self.entries["date_of_birth"].get().strip(),
+            position=self.entries["position"].get().strip(),
+            tags=self.entries["tags"].get().strip(),
+            biography=self.bio_text.get("1.0", "end-1c").strip(),
+            notes=self.notes_text.get("1.0", "end-1c").strip(),
+            contacts=self.contacts,
+            photos=self.photos,
+            additional_info=self.custom_text.get("1.0", "end-1c").strip(),
+            created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            app_version=VERSION
+        )
         
         return data
     
     def _generate_filename(self, full_name):
         """Filename"""
-        if not full_name:
-            return f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        
-        name_parts = full_name.split()
-        surname = name_parts[0] if name_parts else full_name
-        
-        # Clear chars
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            surname = surname.replace(char, '_')
-        
-        timestamp = datetime.now().strftime("%Y%m%d")
-        return f"{surname}_case_{timestamp}.pdf"
+        return generate_filename(full_name)
     
     def _save_profile(self):
         """Save as PDF"""
         try:
             data = self._collect_profile_data()
-            if not data["full_name"]:
+            if not data.full_name:
                 messagebox.showwarning(
                     "Missing Information",
                     "Please enter Full Name before saving.\nThis will be used as the filename."
@@ -517,7 +509,7 @@ class App(ctk.CTk):
                 self.entries["full_name"].focus_set()
                 return
             
-            default_filename = self._generate_filename(data["full_name"])
+            default_filename = self._generate_filename(data.full_name)
             
             save_path = filedialog.asksaveasfilename(
                 defaultextension=".pdf",
@@ -538,7 +530,7 @@ class App(ctk.CTk):
                 f"✅ Profile saved successfully!\n\n"
                 f"📄 File: {os.path.basename(save_path)}\n"
                 f"📁 Location: {os.path.dirname(save_path)}\n\n"
-                f"Total pages generated with {len(data['photos'])} photos."
+                f"Total pages generated with {len(data.photos)} photos."
             )
             
             logger.info(f"Profile saved to: {save_path}")
@@ -552,54 +544,54 @@ class App(ctk.CTk):
             )
     
     def _create_pdf_document(self, data, save_path):
-        """Create PDF"""
+        """Create PDF (save_path may also be a binary stream)"""
         doc = SimpleDocTemplate(save_path, pagesize=A4)
         styles = getSampleStyleSheet()
         story = []
 
         title = Paragraph(
-            f"<b>PERSONAL PROFILE:</b> {data['full_name']}",
+            f"<b>PERSONAL PROFILE:</b> {escape_text(data.full_name)}",
             styles['Title']
         )
         story.append(title)
         story.append(Spacer(1, 0.3 * inch))
         
         info_fields = [
-            ("Date of Birth", data["date_of_birth"]),
-            ("Position", data["position"]),
-            ("Tags", data["tags"]),
-            ("Created", data["created_at"]),
-            ("App Version", data["app_version"])
+            ("Date of Birth", data.date_of_birth),
+            ("Position", data.position),
+            ("Tags", data.tags),
+            ("Created", data.created_at),
+            ("App Version", data.app_version)
         ]
         
         for label, value in info_fields:
             if value:
-                text = f"<b>{label}:</b> {value}"
+                text = f"<b>{label}:</b> {escape_text(value)}"
                 story.append(Paragraph(text, styles['Normal']))
                 story.append(Spacer(1, 0.1 * inch))
         
         story.append(Spacer(1, 0.3 * inch))
         
-        if data["biography"]:
+        if data.biography:
             story.append(Paragraph("<b>Biography:</b>", styles['Heading2']))
-            story.append(Paragraph(data["biography"], styles['Normal']))
+            story.extend(iter_text_flowables(data.biography, styles['Normal']))
             story.append(Spacer(1, 0.2 * inch))
         
-        if data["notes"]:
+        if data.notes:
             story.append(Paragraph("<b>Notes:</b>", styles['Heading2']))
-            story.append(Paragraph(data["notes"], styles['Normal']))
+            story.extend(iter_text_flowables(data.notes, styles['Normal']))
             story.append(Spacer(1, 0.2 * inch))
         
-        if data["contacts"]:
+        if data.contacts:
             story.append(Paragraph("<b>Contacts:</b>", styles['Heading2']))
-            for contact in data["contacts"]:
-                story.append(Paragraph(f"• {contact}", styles['Normal']))
+            for contact in data.contacts:
+                story.append(Paragraph(f"• {escape_text(contact)}", styles['Normal']))
             story.append(Spacer(1, 0.2 * inch))
         
-        if data["photos"]:
+        if data.photos:
             story.append(Paragraph("<b>Photos:</b>", styles['Heading2']))
             
-            for photo_path in data["photos"]:
+            for photo_path in data.photo_paths:
                 if os.path.exists(photo_path):
                     try:
                         with tempfile.NamedTemporaryFile(
@@ -620,7 +612,7 @@ class App(ctk.CTk):
                             )
                             story.append(
                                 Paragraph(
-                                    f"<i>{os.path.basename(photo_path)}</i>",
+                                    f"<i>{escape_text(os.path.basename(photo_path))}</i>",
                                     styles['Italic']
                                 )
                             )
@@ -629,13 +621,13 @@ class App(ctk.CTk):
                         logger.error(f"Failed to add photo {photo_path}: {img_error}")
                         story.append(
                             Paragraph(
-                                f"[Photo: {os.path.basename(photo_path)} - Error: {str(img_error)}]",
+                                escape_text(f"[Photo: {os.path.basename(photo_path)} - Error: {str(img_error)}]"),
                                 styles['Italic']
                             )
                         )
-        if data["additional_info"]:
+        if data.additional_info:
             story.append(Paragraph("<b>Additional Information:</b>", styles['Heading2']))
-            story.append(Paragraph(data["additional_info"], styles['Normal']))
+            story.extend(iter_text_flowables(data.additional_info, styles['Normal']))
         doc.build(story)
 
         self._cleanup_temp_files()
@@ -0,0 +1,341 @@
+"""
+Render metrics for CASER Profile Builder.
+Counters, gauges and latency histograms exported in Prometheus text format.
+
+Pool workers run in separate processes, so jobs are submitted through
+run_measured(); it sends back the metrics recorded during the job and
+unwrap_measured() merges them into the parent's registry.
+"""
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+import logging
+
+from profile_io import atomic_write
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    """Base class: named metric with optional labels."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames, lock):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        body = ",".join(
+            f'{name}="{_escape_label(value)}"' for name, value in pairs
+        )
+        return "{" + body + "}"
+
+    def snapshot(self):
+        """Copy of current values."""
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(_Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Increase counter."""
+        if amount < 0:
+            raise ValueError("Counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Current value."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        values = self.snapshot()
+        if not values and not self.labelnames:
+            values = {(): 0}
+        return [
+            f"{self.name}{self._format_labels(key)} {_format_number(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Gauge(Counter):
+    """Value that goes up and down (e.g. queue depth)."""
+
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames, lock, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """Record one observation."""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (not cumulative), then sum and count
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe duration of the with-block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    def render(self):
+        lines = []
+        for key, state in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = self._format_labels(key, ("le", _format_number(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = self._format_labels(key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {state[-1]}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_number(state[-2])}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds all metrics of the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(
+                    name, documentation, labelnames, self._lock, **kwargs
+                )
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        """
+        Values of counters and histograms (gauges are local state).
+
+        Returns:
+            dict: name -> {label values: value}
+        """
+        return {
+            name: metric.snapshot()
+            for name, metric in list(self._metrics.items())
+            if metric.kind != "gauge"
+        }
+
+    @staticmethod
+    def diff(before, after):
+        """Changes between two snapshots."""
+        delta = {}
+        for name, values in after.items():
+            old_values = before.get(name, {})
+            changed = {}
+            for key, value in values.items():
+                old = old_values.get(key)
+                if isinstance(value, list):
+                    old = old or [0] * len(value)
+                    step = [new - prev for new, prev in zip(value, old)]
+                    if step[-1]:
+                        changed[key] = step
+                elif value != (old or 0):
+                    changed[key] = value - (old or 0)
+            if changed:
+                delta[name] = changed
+        return delta
+
+    def merge(self, delta):
+        """Adds a delta recorded by another process."""
+        with self._lock:
+            for name, values in delta.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    logger.warning(f"Dropping unknown metric from worker: {name}")
+                    continue
+                for key, value in values.items():
+                    current = metric._values.get(key)
+                    if isinstance(value, list):
+                        current = current or [0] * len(value)
+                        metric._values[key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        metric._values[key] = (current or 0) + value
+
+    def render_prometheus(self):
+        """All metrics in Prometheus text exposition format."""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+REGISTRY = MetricsRegistry()
+
+RENDERS = REGISTRY.counter("caser_renders_total", "PDF documents rendered successfully")
+RENDER_FAILURES = REGISTRY.counter("caser_render_failures_total", "PDF renders that raised an error")
+PHOTOS_PROCESSED = REGISTRY.counter("caser_photos_processed_total", "Photos embedded into PDFs")
+PHOTO_FAILURES = REGISTRY.counter("caser_photo_failures_total", "Photos skipped because they could not be read")
+JOB_FAILURES = REGISTRY.counter("caser_job_failures_total", "Pool jobs that failed, including unreadable input", ["pool"])
+BYTES_WRITTEN = REGISTRY.counter("caser_bytes_written_total", "Bytes of PDF output written")
+RENDER_SECONDS = REGISTRY.histogram("caser_render_seconds", "Wall time of a complete render")
+STAGE_SECONDS = REGISTRY.histogram("caser_stage_seconds", "Wall time per render stage", ["stage"])
+QUEUE_DEPTH = REGISTRY.gauge("caser_queue_depth", "Jobs submitted to a worker pool and not finished", ["pool"])
+
+
+def run_measured(func, *args, **kwargs):
+    """
+    Pool job wrapper: runs func and captures metrics it recorded.
+
+    Errors are returned instead of raised so their metrics are not lost.
+
+    Returns:
+        tuple: (result, error, (pid, delta))
+    """
+    before = REGISTRY.snapshot()
+    result, error = None, None
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        error = e
+    delta = REGISTRY.diff(before, REGISTRY.snapshot())
+    return result, error, (os.getpid(), delta)
+
+
+def unwrap_measured(outcome):
+    """
+    Merges worker metrics of a run_measured() result into this process.
+
+    Returns:
+        Result of the job; re-raises its error.
+    """
+    result, error, (pid, delta) = outcome
+    # Same process (e.g. thread pool): values are already in REGISTRY
+    if pid != os.getpid():
+        REGISTRY.merge(delta)
+    if error is not None:
+        raise error
+    return result
+
+
+def write_metrics_file(path, registry=REGISTRY):
+    """Dumps metrics atomically, e.g. for node_exporter textfile collector."""
+    with atomic_write(path) as f:
+        f.write(registry.render_prometheus().encode("utf-8"))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format % args)
+
+
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY):
+    """
+    Serves /metrics from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: call shutdown() to stop
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="caser-metrics", daemon=True)
+    thread.start()
+    logger.info(f"Metrics available at http://{host}:{server.server_port}/metrics")
+    return server
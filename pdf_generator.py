@@ -11,27 +11,44 @@ from reportlab.lib import colors
 from reportlab.platypus.flowables import KeepTogether
 from PIL import Image as PilImage
 import os
-import tempfile
+import io
+import time
 import logging
 
+import metrics
+from profile_model import Profile
+from text_flow import escape_text, iter_text_flowables
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Photo errors that mean a pixel budget was exceeded, not a broken file
+PHOTO_BUDGET_ERRORS = (PilImage.DecompressionBombError, PilImage.DecompressionBombWarning)
+
 
 class PDFGenerator:
     """Class for generating PDF documents from profile data."""
     
     @staticmethod
-    def create_profile_pdf(profile_data, output_path):
+    def create_profile_pdf(profile_data, output_path, strict_photos=False):
         """
         Creates PDF document from profile data.
         
         Args:
-            profile_data (dict): Profile data
-            output_path (str): Path to save PDF
+            profile_data (Profile or dict): Profile data
+            output_path (str or file-like): Path to save PDF, or a binary
+                stream opened for writing
+            strict_photos (bool): Raise PHOTO_BUDGET_ERRORS instead of
+                skipping the oversized photo
             
         Returns:
-            str: Path to saved file
+            str or file-like: Path to saved file (the stream itself when
+                a stream was given)
         """
+        target = PDFGenerator._describe_output(output_path)
+        start_offset = PDFGenerator._stream_position(output_path)
+        started = time.perf_counter()
         try:
             doc = SimpleDocTemplate(
                 output_path,
@@ -42,26 +59,111 @@ class PDFGenerator:
                 rightMargin=2*cm
             )
             
-            styles = getSampleStyleSheet()
-            PDFGenerator._setup_custom_styles(styles)
+            with metrics.STAGE_SECONDS.time(stage="story"):
+                story = PDFGenerator._build_story(profile_data, strict_photos)
+            with metrics.STAGE_SECONDS.time(stage="build"):
+                doc.build(story)
             
-            story = []
-            PDFGenerator._add_header(story, styles, profile_data)
-            PDFGenerator._add_personal_info(story, styles, profile_data)
-            PDFGenerator._add_biography(story, styles, profile_data)
-            PDFGenerator._add_contacts(story, styles, profile_data)
-            PDFGenerator._add_photos(story, styles, profile_data)
-            PDFGenerator._add_additional_info(story, styles, profile_data)
-            PDFGenerator._add_footer(story, styles, profile_data)
-            
-            doc.build(story)
-            logger.info(f"PDF created successfully: {output_path}")
+            metrics.RENDERS.inc()
+            metrics.RENDER_SECONDS.observe(time.perf_counter() - started)
+            written = PDFGenerator._bytes_written(output_path, start_offset)
+            if written:
+                metrics.BYTES_WRITTEN.inc(written)
+            logger.info(f"PDF created successfully: {target}")
             return output_path
             
         except Exception as e:
-            logger.error(f"Failed to create PDF: {str(e)}")
+            metrics.RENDER_FAILURES.inc()
+            logger.error(f"Failed to create PDF ({target}): {str(e)}")
             raise
     
+    @staticmethod
+    def create_profile_pdf_bytes(profile_data):
+        """
+        Creates PDF document in memory.
+        
+        Args:
+            profile_data (Profile or dict): Profile data
+            
+        Returns:
+            bytes: Rendered PDF
+        """
+        buffer = io.BytesIO()
+        PDFGenerator.create_profile_pdf(profile_data, buffer)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def iter_profile_pdf_chunks(profile_data, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Renders PDF and yields it in chunks, e.g. for sockets or uploads.
+        
+        Args:
+            profile_data (Profile or dict): Profile data
+            chunk_size (int): Maximum size of a chunk in bytes
+            
+        Yields:
+            bytes: Consecutive parts of the PDF
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        
+        buffer = io.BytesIO()
+        PDFGenerator.create_profile_pdf(profile_data, buffer)
+        view = buffer.getbuffer()
+        try:
+            for offset in range(0, len(view), chunk_size):
+                yield bytes(view[offset:offset + chunk_size])
+        finally:
+            view.release()
+    
+    @staticmethod
+    def _build_story(profile_data, strict_photos=False):
+        """Build list of flowables for profile."""
+        profile = Profile.coerce(profile_data)
+        styles = getSampleStyleSheet()
+        PDFGenerator._setup_custom_styles(styles)
+        
+        story = []
+        PDFGenerator._add_header(story, styles, profile)
+        PDFGenerator._add_personal_info(story, styles, profile)
+        PDFGenerator._add_biography(story, styles, profile)
+        PDFGenerator._add_contacts(story, styles, profile)
+        PDFGenerator._add_photos(story, styles, profile, strict_photos)
+        PDFGenerator._add_additional_info(story, styles, profile)
+        PDFGenerator._add_footer(story, styles, profile)
+        return story
+    
+    @staticmethod
+    def _describe_output(output):
+        """Readable name of output target for logs."""
+        if isinstance(output, (str, os.PathLike)):
+            return os.fspath(output)
+        # Streams from profile_io.atomic_write carry their destination
+        name = getattr(output, "target_path", None) or getattr(output, "name", None)
+        return name if isinstance(name, str) else f"<{type(output).__name__}>"
+    
+    @staticmethod
+    def _stream_position(output):
+        """Current offset of output stream (None for paths/unseekable)."""
+        if isinstance(output, (str, os.PathLike)):
+            return None
+        try:
+            return output.tell()
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _bytes_written(output, start_offset):
+        """Size of rendered document, if it can be determined."""
+        try:
+            if isinstance(output, (str, os.PathLike)):
+                return os.path.getsize(output)
+            if start_offset is not None:
+                return output.tell() - start_offset
+        except Exception:
+            pass
+        return 0
+    
     @staticmethod
     def _setup_custom_styles(styles):
         """Setup custom styles for document."""
@@ -85,7 +187,7 @@ class PDFGenerator:
     def _add_header(story, styles, data):
         """Add document header."""
         title = Paragraph(
-            f"<b>PERSONAL PROFILE:</b> {data.get('full_name', 'Unnamed Profile')}",
+            f"<b>PERSONAL PROFILE:</b> {escape_text(data.full_name or 'Unnamed Profile')}",
             styles['Title']
         )
         story.append(title)
@@ -95,77 +197,85 @@ class PDFGenerator:
     def _add_personal_info(story, styles, data):
         """Add personal information section."""
         info_fields = [
-            ("Date of Birth", data.get("date_of_birth", "")),
-            ("Position", data.get("position", "")),
-            ("Tags", data.get("tags", "")),
-            ("Created", data.get("created_at", "")),
+            ("Date of Birth", data.date_of_birth),
+            ("Position", data.position),
+            ("Tags", data.tags),
+            ("Created", data.created_at),
         ]
         
         for label, value in info_fields:
             if value:
-                story.append(Paragraph(f"<b>{label}:</b> {value}", styles['Normal']))
+                story.append(Paragraph(f"<b>{label}:</b> {escape_text(value)}", styles['Normal']))
         story.append(Spacer(1, 0.3*inch))
     
     @staticmethod
     def _add_biography(story, styles, data):
         """Add biography section."""
-        bio = data.get("biography", "")
+        bio = data.biography
         if bio:
             story.append(Paragraph("<b>Biography:</b>", styles['Heading2']))
-            story.append(Paragraph(bio, styles['Normal']))
+            story.extend(iter_text_flowables(bio, styles['Normal']))
             story.append(Spacer(1, 0.2*inch))
     
     @staticmethod
     def _add_contacts(story, styles, data):
         """Add contacts section."""
-        contacts = data.get("contacts", [])
+        contacts = data.contacts
         if contacts:
             story.append(Paragraph("<b>Contacts:</b>", styles['Heading2']))
             for contact in contacts:
-                story.append(Paragraph(f"• {contact}", styles['Normal']))
+                story.append(Paragraph(f"• {escape_text(contact)}", styles['Normal']))
             story.append(Spacer(1, 0.2*inch))
     
     @staticmethod
-    def _add_photos(story, styles, data):
-        """Add photos section."""
-        photos = data.get("photos", [])
+    def _add_photos(story, styles, data, strict_photos=False):
+        """Add photos section (unreadable photos are skipped)."""
+        photos = data.photos
         if photos:
             story.append(Paragraph("<b>Photos:</b>", styles['Heading2']))
-            temp_files = []
             
-            for photo_path in photos:
-                if os.path.exists(photo_path):
-                    try:
-                        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-                            img = PilImage.open(photo_path)
-                            img.save(temp_file.name, 'JPEG', quality=85)
-                            temp_files.append(temp_file.name)
-                            
-                            story.append(Image(temp_file.name, width=2*inch, height=2.5*inch))
+            with metrics.STAGE_SECONDS.time(stage="photos"):
+                for photo in photos:
+                    if os.path.exists(photo.path):
+                        try:
+                            story.append(Image(
+                                PDFGenerator._load_photo(photo),
+                                width=2*inch,
+                                height=2.5*inch
+                            ))
                             story.append(Spacer(1, 0.1*inch))
-                    except Exception as e:
-                        logger.error(f"Failed to add photo: {e}")
-            
-            for temp_file in temp_files:
-                try:
-                    os.unlink(temp_file)
-                except:
-                    pass
+                            metrics.PHOTOS_PROCESSED.inc()
+                        except Exception as e:
+                            metrics.PHOTO_FAILURES.inc()
+                            if strict_photos and isinstance(e, PHOTO_BUDGET_ERRORS):
+                                raise
+                            logger.error(f"Failed to add photo: {e}")
+    
+    @staticmethod
+    def _load_photo(photo):
+        """Re-encode photo (PhotoRef) as JPEG in memory (no temp files)."""
+        buffer = io.BytesIO()
+        with photo.open() as source, PilImage.open(source) as img:
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.save(buffer, 'JPEG', quality=85)
+        buffer.seek(0)
+        return buffer
     
     @staticmethod
     def _add_additional_info(story, styles, data):
         """Add additional information section."""
-        additional = data.get("additional_info", "")
+        additional = data.additional_info
         if additional:
             story.append(Paragraph("<b>Additional Information:</b>", styles['Heading2']))
-            story.append(Paragraph(additional, styles['Normal']))
+            story.extend(iter_text_flowables(additional, styles['Normal']))
     
     @staticmethod
     def _add_footer(story, styles, data):
         """Add document footer."""
         story.append(Spacer(1, 0.5*inch))
         footer = Paragraph(
-            f"<i>Generated by CASER Profile Builder v{data.get('app_version', '1.0')}</i>",
+            f"<i>Generated by CASER Profile Builder v{escape_text(data.app_version or '1.0')}</i>",
             styles['Italic']
         )
         story.append(footer)
@@ -174,5 +284,8 @@ class PDFGenerator:
 def create_pdf_from_profile(data, output_path):
     """Simplified function for creating PDF."""
     return PDFGenerator.create_profile_pdf(data, output_path)
-```
 
+
+def create_pdf_bytes_from_profile(data):
+    """Simplified function for creating PDF in memory."""
+    return PDFGenerator.create_profile_pdf_bytes(data)
@@ -0,0 +1,142 @@
+"""
+Profile file helpers for CASER Profile Builder.
+Loading profile JSON exported by upstream systems and writing outputs safely.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+import glob
+import json
+import os
+import tempfile
+import logging
+
+from profile_model import Profile
+
+logger = logging.getLogger(__name__)
+
+
+def load_profile(json_path):
+    """
+    Loads profile data from JSON file.
+
+    Photo paths are resolved relative to the JSON file's directory.
+
+    Args:
+        json_path (str): Path to profile JSON (keys as in Profile.to_dict)
+
+    Returns:
+        Profile: Validated profile
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict):
+        raise ValueError(f"Profile must be a JSON object: {json_path}")
+
+    base_dir = os.path.dirname(os.path.abspath(json_path))
+    photos = data.get("photos") or []
+    if not isinstance(photos, list) or not all(isinstance(p, str) for p in photos):
+        raise ValueError(f"Profile photos must be a list of paths: {json_path}")
+    data["photos"] = [
+        os.path.normpath(os.path.join(base_dir, photo))
+        for photo in photos
+    ]
+    return Profile.from_dict(data)
+
+
+def generate_filename(full_name):
+    """
+    Default PDF filename for profile: "<Surname>_case_<YYYYMMDD>.pdf".
+
+    Args:
+        full_name (str): Full name, surname first
+
+    Returns:
+        str: File name without directory
+    """
+    if not full_name:
+        return f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+    name_parts = full_name.split()
+    surname = name_parts[0] if name_parts else full_name
+
+    # Clear chars
+    invalid_chars = '<>:"/\\|?*'
+    for char in invalid_chars:
+        surname = surname.replace(char, '_')
+
+    timestamp = datetime.now().strftime("%Y%m%d")
+    return f"{surname}_case_{timestamp}.pdf"
+
+
+def file_signature(path):
+    """
+    Cheap change marker for a file.
+
+    Returns:
+        list or None: [mtime_ns, size], or None if file is missing
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Opens a temp file next to path and moves it into place on success.
+
+    Readers never see a partially written file; on error the temp
+    file is removed and the old file (if any) stays untouched. The
+    yielded stream's target_path is the final path (its name is an fd).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.",
+        suffix=".tmp",
+        dir=directory
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.target_path = os.fspath(path)
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def remove_stale_temps(path):
+    """
+    Removes temp files atomic_write left for path.
+
+    Needed after the writing process was killed, since its cleanup
+    never ran.
+
+    Returns:
+        int: Number of files removed
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    pattern = os.path.join(glob.escape(directory), f".{glob.escape(os.path.basename(path))}.*.tmp")
+    removed = 0
+    for temp_path in glob.glob(pattern):
+        try:
+            os.unlink(temp_path)
+            removed += 1
+        except OSError as e:
+            logger.warning(f"Failed to remove stale temp file {temp_path}: {e}")
+    return removed
+
+
+def write_json_atomic(path, data):
+    """Writes JSON document atomically."""
+    with atomic_write(path) as f:
+        f.write(json.dumps(data, indent=2, sort_keys=True).encode("utf-8"))
@@ -0,0 +1,195 @@
+"""
+Typed profile record for CASER Profile Builder.
+Replaces loose profile dicts and keeps worker IPC small.
+
+A Profile pickles through a compact positional JSON codec, and photos
+travel as PhotoRef file references, so image data is never copied into
+the pickled job.
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CODEC_VERSION = 1
+
+TEXT_FIELDS = (
+    "full_name",
+    "date_of_birth",
+    "position",
+    "tags",
+    "biography",
+    "notes",
+    "additional_info",
+    "created_at",
+    "app_version",
+)
+
+
+class PhotoRef:
+    """Reference to a photo file; workers open it themselves."""
+
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        if not isinstance(path, str) or not path:
+            raise ValueError(f"Invalid photo path: {path!r}")
+        self.path = path
+
+    @property
+    def name(self):
+        """File name without directory."""
+        return self.path.replace("\\", "/").rsplit("/", 1)[-1]
+
+    def open(self):
+        """
+        Opens the photo for reading.
+
+        Returns:
+            file-like: Binary stream positioned at the start
+        """
+        return open(self.path, "rb")
+
+    @classmethod
+    def coerce(cls, value):
+        """PhotoRef from a path, a {"path": ...} dict or a PhotoRef."""
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, str):
+            return cls(value)
+        if isinstance(value, dict):
+            return cls(value.get("path"))
+        raise ValueError(f"Invalid photo reference: {value!r}")
+
+    def __eq__(self, other):
+        return isinstance(other, PhotoRef) and self.path == other.path
+
+    def __repr__(self):
+        return f"PhotoRef({self.path!r})"
+
+
+def _as_tuple(field, value):
+    """Tuple of a list field; strings and scalars are rejected, not iterated."""
+    if not isinstance(value, (list, tuple)):
+        raise ValueError(f"Profile field '{field}' must be a list")
+    return tuple(value)
+
+
+class Profile:
+    """Validated profile record (what App._collect_profile_data produces)."""
+
+    __slots__ = TEXT_FIELDS + ("contacts", "photos")
+
+    def __init__(self, full_name="", date_of_birth="", position="", tags="",
+                 biography="", notes="", contacts=(), photos=(),
+                 additional_info="", created_at="", app_version=""):
+        self.full_name = full_name
+        self.date_of_birth = date_of_birth
+        self.position = position
+        self.tags = tags
+        self.biography = biography
+        self.notes = notes
+        self.contacts = _as_tuple("contacts", contacts)
+        self.photos = tuple(PhotoRef.coerce(photo) for photo in _as_tuple("photos", photos))
+        self.additional_info = additional_info
+        self.created_at = created_at
+        self.app_version = app_version
+        self.validate()
+
+    def validate(self):
+        """Raises ValueError when a field has the wrong type."""
+        for field in TEXT_FIELDS:
+            if not isinstance(getattr(self, field), str):
+                raise ValueError(f"Profile field '{field}' must be a string")
+        for contact in self.contacts:
+            if not isinstance(contact, str):
+                raise ValueError("Profile contacts must be strings")
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds profile from dict (JSON or legacy profile data).
+
+        Missing and None fields become empty; unknown keys are ignored.
+        """
+        if not isinstance(data, dict):
+            raise ValueError("Profile data must be a dict")
+        kwargs = {field: data.get(field) or "" for field in TEXT_FIELDS}
+        contacts = data.get("contacts")
+        photos = data.get("photos")
+        return cls(
+            contacts=() if contacts is None else contacts,
+            photos=() if photos is None else photos,
+            **kwargs
+        )
+
+    @classmethod
+    def coerce(cls, data):
+        """Profile as is, or built from dict."""
+        return data if isinstance(data, cls) else cls.from_dict(data)
+
+    def to_dict(self):
+        """Plain dict in the legacy profile data shape."""
+        data = {field: getattr(self, field) for field in TEXT_FIELDS}
+        data["contacts"] = list(self.contacts)
+        data["photos"] = [photo.path for photo in self.photos]
+        return data
+
+    def replace(self, **changes):
+        """Copy with some fields changed."""
+        values = {field: getattr(self, field) for field in self.__slots__}
+        values.update(changes)
+        return Profile(**values)
+
+    @property
+    def photo_paths(self):
+        """Paths of all photos."""
+        return [photo.path for photo in self.photos]
+
+    def __eq__(self, other):
+        return isinstance(other, Profile) and encode_profile(self) == encode_profile(other)
+
+    def __repr__(self):
+        return f"Profile(full_name={self.full_name!r}, photos={len(self.photos)})"
+
+    def __reduce__(self):
+        # Pickle (e.g. to pool workers) through the compact codec
+        return (decode_profile, (encode_profile(self),))
+
+
+def encode_profile(profile):
+    """
+    Serializes profile into compact bytes.
+
+    Fields are stored positionally in a JSON array without key names.
+
+    Returns:
+        bytes: Encoded profile
+    """
+    record = [CODEC_VERSION]
+    record.extend(getattr(profile, field) for field in TEXT_FIELDS)
+    record.append(list(profile.contacts))
+    record.append([photo.path for photo in profile.photos])
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_profile(payload):
+    """
+    Restores profile from encode_profile() output.
+
+    Returns:
+        Profile: Validated profile
+    """
+    record = json.loads(payload)
+    if not isinstance(record, list) or not record or record[0] != CODEC_VERSION:
+        raise ValueError("Unsupported profile encoding")
+    if len(record) != len(TEXT_FIELDS) + 3:
+        raise ValueError("Corrupt profile encoding")
+    values = dict(zip(TEXT_FIELDS, record[1:]))
+    return Profile(
+        contacts=record[-2],
+        photos=record[-1],
+        **values
+    )
+
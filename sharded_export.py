@@ -0,0 +1,471 @@
+"""
+Sharded, resumable batch export for CASER Profile Builder.
+Several machines share one input folder and each renders its own shard.
+
+Every node appends finished records to its shard manifest on shared
+storage, so a restarted node skips work that is already done. No
+coordinator is needed: shards are computed from the record ids alone.
+
+Usage:
+    python sharded_export.py run INPUT_DIR OUTPUT_DIR --shard 0 --shards 4
+    python sharded_export.py merge INPUT_DIR OUTPUT_DIR --shards 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+import logging
+
+import metrics
+from guarded_render import (
+    GuardedRenderer, DEFAULT_TIMEOUT, DEFAULT_MAX_RSS_MB, DEFAULT_MAX_IMAGE_PIXELS
+)
+from profile_io import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_DIRNAME = ".caser_manifests"
+STRATEGIES = ("hash", "range")
+
+
+def list_records(input_dir):
+    """
+    Lists profile JSON files below input_dir.
+
+    Returns:
+        list: Sorted record ids (paths relative to input_dir, "/" separated)
+    """
+    records = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.lower().endswith(".json") and not name.startswith("."):
+                rel = os.path.relpath(os.path.join(root, name), input_dir)
+                records.append(rel.replace(os.sep, "/"))
+    records.sort()
+    return records
+
+
+def shard_of(record_id, shards):
+    """Stable hash shard of a record (same on every machine and run)."""
+    digest = hashlib.sha1(record_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def select_shard(records, shard, shards, strategy="hash"):
+    """
+    Records belonging to one shard.
+
+    Args:
+        records (list): Sorted record ids (see list_records)
+        shard (int): Shard index, 0 <= shard < shards
+        shards (int): Total number of shards
+        strategy (str): "hash" (stable when records are added) or
+            "range" (contiguous slices of the sorted list)
+
+    Returns:
+        list: Record ids of the shard
+    """
+    if not 0 <= shard < shards:
+        raise ValueError(f"shard must be in [0, {shards}), got {shard}")
+    if strategy == "hash":
+        return [r for r in records if shard_of(r, shards) == shard]
+    if strategy == "range":
+        start = len(records) * shard // shards
+        end = len(records) * (shard + 1) // shards
+        return records[start:end]
+    raise ValueError(f"Unknown shard strategy: {strategy}")
+
+
+def output_path_for(output_dir, record_id):
+    """PDF path of a record, mirroring the input folder layout."""
+    stem = os.path.splitext(record_id)[0]
+    return os.path.join(output_dir, *stem.split("/")) + ".pdf"
+
+
+def default_manifest_dir(output_dir):
+    return os.path.join(os.path.abspath(output_dir), MANIFEST_DIRNAME)
+
+
+def manifest_path(manifest_dir, shard, shards):
+    return os.path.join(manifest_dir, f"shard-{shard:04d}-of-{shards:04d}.jsonl")
+
+
+def failure_log_path(manifest_dir, shard, shards):
+    """Per-shard log of failed render attempts, next to the manifest."""
+    return os.path.join(manifest_dir, f"shard-{shard:04d}-of-{shards:04d}.failures.jsonl")
+
+
+def read_manifest(path):
+    """
+    Reads shard manifest; the last entry of a record wins.
+
+    A torn final line (crash during append) is ignored.
+
+    Returns:
+        dict: record id -> entry
+    """
+    entries = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and "id" in entry:
+                    entries[entry["id"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class ShardLock:
+    """
+    Lock file that keeps two nodes off the same shard.
+
+    Created with O_EXCL, which is atomic on local disks and NFSv3+.
+    A lock left by a crashed process on this host is reclaimed
+    automatically (moved aside with an atomic rename, so two processes
+    reclaiming it at once cannot both win); a lock held by another host
+    needs force=True.
+    """
+
+    def __init__(self, path, force=False):
+        self.path = path
+        self.force = force
+        self.acquired = False
+
+    def __enter__(self):
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        if self.force:
+            self._remove()
+        try:
+            fd = self._create()
+        except FileExistsError:
+            holder = self._read_holder()
+            if not self._holder_is_dead(holder):
+                raise RuntimeError(
+                    f"Shard is locked by {holder or 'another node'} ({self.path}); "
+                    "use --force if that node is gone"
+                )
+            logger.warning(f"Reclaiming shard lock of dead process {holder}")
+            try:
+                fd = self._reclaim(holder, owner)
+            except FileExistsError:
+                raise RuntimeError(f"Shard lock was taken by another process ({self.path})")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(owner)
+        self.acquired = True
+        return self
+
+    def _create(self):
+        return os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+
+    def _reclaim(self, holder, owner):
+        """
+        Replaces the lock of dead holder with a new one.
+
+        Raises:
+            FileExistsError: Another process reclaimed the lock first
+        """
+        aside = f"{self.path}.{owner.replace(':', '-')}.stale"
+        try:
+            os.rename(self.path, aside)
+        except FileNotFoundError:
+            return self._create()  # moved aside by another reclaimer; race it on O_EXCL
+        try:
+            if self._read_holder(aside) != holder:
+                # Another process reclaimed it between our read and rename;
+                # this is its fresh lock, so put it back
+                try:
+                    os.link(aside, self.path)
+                except OSError as e:
+                    logger.error(f"Cannot restore shard lock {self.path}: {e}")
+                raise FileExistsError(self.path)
+        finally:
+            os.unlink(aside)
+        return self._create()
+
+    def _remove(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _read_holder(self, path=None):
+        try:
+            with open(path or self.path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    @staticmethod
+    def _holder_is_dead(holder):
+        """True if holder ("host:pid") is a process of this host that is gone."""
+        host, _, pid = holder.rpartition(":")
+        if host != socket.gethostname() or not pid.isdigit():
+            return False
+        if os.name != "posix":
+            return False  # os.kill(pid, 0) would terminate the process on Windows
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            return False  # exists, owned by another user
+        return False
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.acquired:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class ShardRunner:
+    """Renders one shard and checkpoints results to its manifest."""
+
+    def __init__(self, input_dir, output_dir, shard, shards, strategy="hash",
+                 manifest_dir=None, retry_failed=True, renderer=None):
+        """
+        Args:
+            input_dir (str): Shared folder with profile JSON files
+            output_dir (str): Shared folder for PDFs
+            shard (int): Shard handled by this node
+            shards (int): Total number of shards
+            strategy (str): "hash" or "range"
+            manifest_dir (str): Shared manifest folder (default: in output_dir)
+            retry_failed (bool): Re-render records that failed previously
+            renderer (GuardedRenderer): Worker pool (default settings and
+                per-shard failure log if None)
+        """
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.shard = shard
+        self.shards = shards
+        self.strategy = strategy
+        self.manifest_dir = manifest_dir or default_manifest_dir(self.output_dir)
+        self.retry_failed = retry_failed
+        self.renderer = renderer or GuardedRenderer(
+            failure_log=failure_log_path(self.manifest_dir, shard, shards)
+        )
+        self.manifest = manifest_path(self.manifest_dir, shard, shards)
+
+    def pending_records(self):
+        """Records of this shard that still need rendering."""
+        done = read_manifest(self.manifest)
+        records = select_shard(list_records(self.input_dir), self.shard, self.shards, self.strategy)
+        skip = {"done"} if self.retry_failed else {"done", "failed"}
+        pending = [r for r in records if done.get(r, {}).get("status") not in skip]
+        logger.info(
+            f"Shard {self.shard}/{self.shards}: {len(records)} records, "
+            f"{len(records) - len(pending)} already finished"
+        )
+        return pending
+
+    def run(self, force=False):
+        """
+        Renders pending records of the shard.
+
+        Returns:
+            dict: {"done": n, "failed": n}
+        """
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        counts = {"done": 0, "failed": 0}
+
+        with ShardLock(self.manifest + ".lock", force=force):
+            jobs = []
+            for record_id in self.pending_records():
+                output_path = output_path_for(self.output_dir, record_id)
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                jobs.append((
+                    record_id,
+                    os.path.join(self.input_dir, *record_id.split("/")),
+                    output_path
+                ))
+
+            host = socket.gethostname()
+            with open(self.manifest, "a", encoding="utf-8") as manifest:
+                for result in self.renderer.render_many(jobs):
+                    status = "failed" if result["status"] == "failed" else "done"
+                    counts[status] += 1
+                    entry = {
+                        "id": result["job_id"],
+                        "status": status,
+                        "level": result["level"],
+                        "output": os.path.relpath(result["output"], self.output_dir)
+                        if result["output"] else None,
+                        "errors": result["errors"],
+                        "host": host,
+                        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    }
+                    # Checkpoint: the record survives a crash right after this line
+                    manifest.write(json.dumps(entry) + "\n")
+                    manifest.flush()
+                    os.fsync(manifest.fileno())
+
+        logger.info(
+            f"Shard {self.shard}/{self.shards} finished: "
+            f"{counts['done']} done, {counts['failed']} failed"
+        )
+        return counts
+
+
+def merge_manifests(input_dir, output_dir, shards, strategy="hash", manifest_dir=None):
+    """
+    Combines all shard manifests into an overall completion report.
+
+    Args:
+        input_dir (str): Shared input folder (defines the full record set)
+        output_dir (str): Shared output folder
+        shards (int): Total number of shards
+        strategy (str): Strategy used by the runs
+        manifest_dir (str): Manifest folder (default: in output_dir)
+
+    Returns:
+        dict: Totals, per-shard counts, failed and missing record ids
+    """
+    manifest_dir = manifest_dir or default_manifest_dir(output_dir)
+    records = list_records(input_dir)
+    report = {
+        "total": len(records),
+        "done": 0,
+        "failed": [],
+        "missing": [],
+        "shards": [],
+    }
+
+    for shard in range(shards):
+        entries = read_manifest(manifest_path(manifest_dir, shard, shards))
+        shard_records = select_shard(records, shard, shards, strategy)
+        counts = {"shard": shard, "total": len(shard_records), "done": 0, "failed": 0, "missing": 0}
+        for record_id in shard_records:
+            status = entries.get(record_id, {}).get("status")
+            if status == "done":
+                counts["done"] += 1
+            elif status == "failed":
+                counts["failed"] += 1
+                report["failed"].append({
+                    "id": record_id,
+                    "errors": entries[record_id].get("errors", []),
+                })
+            else:
+                counts["missing"] += 1
+                report["missing"].append(record_id)
+        report["done"] += counts["done"]
+        report["shards"].append(counts)
+
+    report["complete"] = not report["failed"] and not report["missing"]
+    return report
+
+
+def _positive_int(value):
+    """argparse type for counts that must be at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Sharded, resumable profile export.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="render one shard")
+    run_parser.add_argument("input_dir")
+    run_parser.add_argument("output_dir")
+    run_parser.add_argument("--shard", type=int, required=True)
+    run_parser.add_argument("--shards", type=_positive_int, required=True)
+    run_parser.add_argument("--strategy", choices=STRATEGIES, default="hash")
+    run_parser.add_argument("--manifest-dir", default=None)
+    run_parser.add_argument("--workers", type=int, default=None)
+    run_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    run_parser.add_argument("--max-rss-mb", type=int, default=DEFAULT_MAX_RSS_MB)
+    run_parser.add_argument("--max-image-pixels", type=int, default=DEFAULT_MAX_IMAGE_PIXELS)
+    run_parser.add_argument(
+        "--failure-log", default=None,
+        help="JSON-lines file for failed attempts (default: next to the shard manifest)"
+    )
+    run_parser.add_argument("--skip-failed", action="store_true", help="do not retry records that failed before")
+    run_parser.add_argument("--force", action="store_true", help="take over a shard locked by a dead node")
+    run_parser.add_argument("--metrics-file", default=None, help="write Prometheus metrics to this file")
+
+    merge_parser = commands.add_parser("merge", help="report overall completion")
+    merge_parser.add_argument("input_dir")
+    merge_parser.add_argument("output_dir")
+    merge_parser.add_argument("--shards", type=_positive_int, required=True)
+    merge_parser.add_argument("--strategy", choices=STRATEGIES, default="hash")
+    merge_parser.add_argument("--manifest-dir", default=None)
+    merge_parser.add_argument("--report", default=None, help="write JSON report to this file")
+
+    args = parser.parse_args()
+    if args.command == "run" and not 0 <= args.shard < args.shards:
+        run_parser.error(f"--shard must be in [0, {args.shards}), got {args.shard}")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.command == "run":
+        manifest_dir = args.manifest_dir or default_manifest_dir(args.output_dir)
+        runner = ShardRunner(
+            args.input_dir,
+            args.output_dir,
+            args.shard,
+            args.shards,
+            strategy=args.strategy,
+            manifest_dir=manifest_dir,
+            retry_failed=not args.skip_failed,
+            renderer=GuardedRenderer(
+                workers=args.workers,
+                timeout=args.timeout,
+                max_rss_mb=args.max_rss_mb,
+                max_image_pixels=args.max_image_pixels,
+                failure_log=args.failure_log or failure_log_path(
+                    manifest_dir, args.shard, args.shards
+                )
+            )
+        )
+        try:
+            counts = runner.run(force=args.force)
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(2)
+        if args.metrics_file:
+            metrics.write_metrics_file(args.metrics_file)
+        sys.exit(1 if counts["failed"] else 0)
+
+    report = merge_manifests(
+        args.input_dir,
+        args.output_dir,
+        args.shards,
+        strategy=args.strategy,
+        manifest_dir=args.manifest_dir
+    )
+    if args.report:
+        write_json_atomic(args.report, report)
+    logger.info(
+        f"{report['done']}/{report['total']} done, {len(report['failed'])} failed, "
+        f"{len(report['missing'])} missing"
+    )
+    for counts in report["shards"]:
+        logger.info(
+            f"  shard {counts['shard']}: {counts['done']}/{counts['total']} done, "
+            f"{counts['failed']} failed, {counts['missing']} missing"
+        )
+    sys.exit(0 if report["complete"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Free-text helpers for CASER Profile Builder PDFs.
+Turns long user text into small escaped paragraphs for reportlab.
+
+One huge Paragraph makes reportlab's line breaking and page splitting
+superlinear; bounded paragraphs keep rendering time linear in text length.
+"""
+
+from xml.sax.saxutils import escape
+
+from reportlab.platypus import Paragraph, Spacer
+from reportlab.lib.units import inch
+
+# Longest text put into a single Paragraph
+MAX_PARAGRAPH_CHARS = 2000
+
+
+def escape_text(text):
+    """Escapes user text for reportlab paragraph markup (&, <, >)."""
+    return escape(str(text)) if text else ""
+
+
+def iter_text_blocks(text, max_chars=MAX_PARAGRAPH_CHARS):
+    """
+    Splits text into lines, and long lines into chunks of max_chars.
+
+    Lines are produced lazily, so huge texts are not copied into a list.
+    Chunks end at whitespace where possible.
+
+    Args:
+        text (str): Raw text
+        max_chars (int): Maximum length of a chunk
+
+    Yields:
+        str: Raw (unescaped) chunk; "" for each blank line
+    """
+    if max_chars <= 0:
+        raise ValueError("max_chars must be positive")
+
+    start = 0
+    length = len(text)
+    while start <= length:
+        end = text.find("\n", start)
+        if end == -1:
+            end = length
+        line = text[start:end].rstrip("\r")
+
+        if not line.strip():
+            yield ""
+        else:
+            yield from _split_line(line, max_chars)
+        start = end + 1
+
+
+def _split_line(line, max_chars):
+    """Cuts line into chunks, preferring whitespace boundaries."""
+    while len(line) > max_chars:
+        cut = line.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        yield line[:cut]
+        line = line[cut:].lstrip(" ")
+    if line:
+        yield line
+
+
+def iter_text_flowables(text, style, max_chars=MAX_PARAGRAPH_CHARS):
+    """
+    Converts free text into escaped Paragraph flowables.
+
+    Each line becomes its own paragraph; blank lines become a small gap.
+
+    Args:
+        text (str): Raw text
+        style (ParagraphStyle): Paragraph style
+        max_chars (int): Maximum length of one paragraph
+
+    Yields:
+        Flowable: Paragraph or Spacer
+    """
+    gap = False
+    produced = False
+    for block in iter_text_blocks(text, max_chars):
+        if not block:
+            gap = produced
+            continue
+        if gap:
+            yield Spacer(1, 0.1*inch)
+            gap = False
+        yield Paragraph(escape_text(block), style)
+        produced = True
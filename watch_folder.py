@@ -0,0 +1,358 @@
+"""
+Watch-folder mode for CASER Profile Builder.
+Polls a directory with profile JSON files and re-renders changed profiles.
+
+Usage:
+    python watch_folder.py INPUT_DIR OUTPUT_DIR [--workers N] [--once]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import argparse
+import json
+import os
+import time
+import logging
+
+import metrics
+from pdf_generator import PDFGenerator
+from profile_io import load_profile, file_signature, atomic_write, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+STATE_FILENAME = ".caser_watch_state.json"
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_DEBOUNCE = 2.0
+
+
+def render_profile_file(json_path, output_path):
+    """
+    Worker job: renders one profile JSON into output_path atomically.
+
+    Returns:
+        str: Path to saved file
+    """
+    data = load_profile(json_path)
+    with atomic_write(output_path) as f:
+        PDFGenerator.create_profile_pdf(data, f)
+    return output_path
+
+
+class FolderWatcher:
+    """Watches input folder and keeps output folder in sync."""
+
+    def __init__(self, input_dir, output_dir, workers=None,
+                 poll_interval=DEFAULT_POLL_INTERVAL, debounce=DEFAULT_DEBOUNCE,
+                 state_path=None, metrics_file=None):
+        """
+        Args:
+            input_dir (str): Folder with profile *.json files and photos
+            output_dir (str): Folder for rendered PDFs
+            workers (int): Worker processes (default: CPU count)
+            poll_interval (float): Seconds between scans
+            debounce (float): Seconds a profile must stay unchanged before render
+            state_path (str): State file (default: inside output_dir)
+            metrics_file (str): Prometheus text file refreshed every poll
+        """
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.state_path = state_path or os.path.join(self.output_dir, STATE_FILENAME)
+        self.metrics_file = metrics_file
+
+        # name -> fingerprint of last successful render (persisted)
+        self.rendered = {}
+        # name -> fingerprint that failed to render (persisted, not retried)
+        self.failed = {}
+        # name -> (fingerprint, first time seen with that fingerprint)
+        self.pending = {}
+        # name -> (future, fingerprint)
+        self.in_flight = {}
+        # name -> (json signature, photo paths) to avoid re-parsing JSON
+        self._photo_cache = {}
+        # names in flight when a worker crash broke the pool; each is
+        # re-rendered alone in the quarantine pool to find the culprit
+        self._suspects = set()
+
+        self._executor = None
+        self._quarantine = None
+
+    def output_path_for(self, name):
+        """PDF path for profile JSON file name."""
+        return os.path.join(self.output_dir, os.path.splitext(name)[0] + ".pdf")
+
+    def load_state(self):
+        """Loads fingerprints of profiles rendered by a previous run."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.rendered = state.get("rendered", {})
+            self.failed = state.get("failed", {})
+            logger.info(
+                f"Loaded watch state: {len(self.rendered)} rendered, {len(self.failed)} failed"
+            )
+        except FileNotFoundError:
+            self.rendered, self.failed = {}, {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable state file {self.state_path}: {e}")
+            self.rendered, self.failed = {}, {}
+
+    def save_state(self):
+        """Persists fingerprints atomically."""
+        write_json_atomic(self.state_path, {"rendered": self.rendered, "failed": self.failed})
+
+    def _photos_for(self, name, json_path, json_sig):
+        """Photo paths of a profile, re-read only when the JSON changed."""
+        cached = self._photo_cache.get(name)
+        if cached and cached[0] == json_sig:
+            return cached[1]
+        try:
+            photos = load_profile(json_path).photo_paths
+        except Exception as e:
+            # Probably still being written; the fingerprint will change again
+            logger.debug(f"Cannot parse {json_path} yet: {e}")
+            photos = []
+        self._photo_cache[name] = (json_sig, photos)
+        return photos
+
+    def scan(self):
+        """
+        Fingerprints every profile in input folder.
+
+        A fingerprint covers the JSON file and all photos it references,
+        so replacing a photo re-renders only the profiles that use it.
+
+        Returns:
+            dict: name -> fingerprint
+        """
+        current = {}
+        for entry in os.scandir(self.input_dir):
+            if entry.name.startswith(".") or not entry.name.lower().endswith(".json"):
+                continue
+            if not entry.is_file():
+                continue
+            json_sig = file_signature(entry.path)
+            if json_sig is None:
+                continue
+            photos = self._photos_for(entry.name, entry.path, json_sig)
+            current[entry.name] = [json_sig] + [
+                [photo, file_signature(photo)] for photo in photos
+            ]
+        return current
+
+    def poll(self):
+        """
+        Runs one scan cycle: collects finished jobs, submits settled changes.
+
+        Returns:
+            int: Number of jobs submitted
+        """
+        self._collect_finished()
+
+        now = time.monotonic()
+        current = self.scan()
+        submitted = 0
+
+        for name in list(self.rendered):
+            if name not in current and name not in self.in_flight:
+                self._remove_output(name)
+        for name in list(self.failed):
+            if name not in current:
+                del self.failed[name]
+
+        for name, fingerprint in current.items():
+            if (name in self.in_flight
+                    or self.rendered.get(name) == fingerprint
+                    or self.failed.get(name) == fingerprint):
+                self.pending.pop(name, None)
+                continue
+
+            seen = self.pending.get(name)
+            if seen is None or seen[0] != fingerprint:
+                self.pending[name] = (fingerprint, now)
+                if self.debounce > 0:
+                    continue
+            elif now - seen[1] < self.debounce:
+                continue
+            if name in self._suspects and self._quarantine_busy():
+                continue
+
+            self.pending.pop(name, None)
+            self.in_flight[name] = (self._submit(name), fingerprint)
+            submitted += 1
+
+        for name in list(self.pending):
+            if name not in current:
+                del self.pending[name]
+
+        metrics.QUEUE_DEPTH.set(len(self.in_flight), pool="watch")
+        if submitted:
+            logger.info(f"Submitted {submitted} profiles ({len(self.in_flight)} in flight)")
+        if self.metrics_file:
+            metrics.write_metrics_file(self.metrics_file)
+        return submitted
+
+    def _quarantine_busy(self):
+        return any(name in self._suspects for name in self.in_flight)
+
+    def _submit(self, name):
+        """Submits render job, replacing a pool that a worker crash broke."""
+        quarantine = name in self._suspects
+        args = (
+            metrics.run_measured,
+            render_profile_file,
+            os.path.join(self.input_dir, name),
+            self.output_path_for(name)
+        )
+        executor = self._quarantine if quarantine else self._executor
+        if executor is not None:
+            try:
+                return executor.submit(*args)
+            except BrokenProcessPool:
+                logger.warning("Worker pool is broken (a worker crashed); starting a new one")
+                executor.shutdown(wait=False)
+        if quarantine:
+            executor = self._quarantine = ProcessPoolExecutor(max_workers=1)
+        else:
+            executor = self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return executor.submit(*args)
+
+    def _collect_finished(self):
+        """Records results of completed jobs."""
+        changed = False
+        for name, (future, fingerprint) in list(self.in_flight.items()):
+            if not future.done():
+                continue
+            del self.in_flight[name]
+            if future.cancelled():
+                continue
+            try:
+                output_path = metrics.unwrap_measured(future.result())
+                self.rendered[name] = fingerprint
+                self.failed.pop(name, None)
+                self._suspects.discard(name)
+                logger.info(f"Rendered {name} -> {output_path}")
+            except BrokenProcessPool as e:
+                if name not in self._suspects:
+                    # Every job in flight fails when one worker dies, so this
+                    # one may be innocent: render it again, alone, right away
+                    self._suspects.add(name)
+                    self.pending[name] = (fingerprint, time.monotonic() - self.debounce)
+                    logger.warning(f"Worker pool broke while rendering {name}; retrying alone")
+                    continue
+                # It crashed the quarantine pool on its own: a real failure
+                self._suspects.discard(name)
+                self.failed[name] = fingerprint
+                metrics.JOB_FAILURES.inc(pool="watch")
+                logger.error(f"Failed to render {name}: worker crashed ({e})")
+            except Exception as e:
+                # Retried only once the profile or one of its photos changes
+                self._suspects.discard(name)
+                self.failed[name] = fingerprint
+                metrics.JOB_FAILURES.inc(pool="watch")
+                logger.error(f"Failed to render {name}: {e}")
+            changed = True
+        metrics.QUEUE_DEPTH.set(len(self.in_flight), pool="watch")
+        if changed:
+            self.save_state()
+
+    def _remove_output(self, name):
+        """Drops PDF and state of a deleted profile."""
+        try:
+            os.unlink(self.output_path_for(name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove output for {name}: {e}")
+            return
+        del self.rendered[name]
+        self._photo_cache.pop(name, None)
+        self.save_state()
+        logger.info(f"Removed output for deleted profile {name}")
+
+    def run(self, stop_event=None, once=False):
+        """
+        Watches until stop_event is set (or KeyboardInterrupt).
+
+        Args:
+            stop_event (threading.Event): Optional stop signal
+            once (bool): Render everything outstanding and return
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.load_state()
+        logger.info(f"Watching {self.input_dir} -> {self.output_dir}")
+
+        # Not a with block: poll() replaces the pool when a worker crash breaks it
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            if once:
+                debounce, self.debounce = self.debounce, 0
+                try:
+                    self.poll()
+                    while self.in_flight:
+                        for future, _ in list(self.in_flight.values()):
+                            future.exception()
+                        # Collects results and resubmits jobs lost to a pool break
+                        self.poll()
+                finally:
+                    self.debounce = debounce
+                return
+
+            while stop_event is None or not stop_event.is_set():
+                self.poll()
+                if stop_event is not None:
+                    stop_event.wait(self.poll_interval)
+                else:
+                    time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Watch stopped by user")
+        finally:
+            for future, _ in self.in_flight.values():
+                future.cancel()
+            self._collect_finished()
+            executor, self._executor = self._executor, None
+            executor.shutdown()
+            if self._quarantine is not None:
+                quarantine, self._quarantine = self._quarantine, None
+                quarantine.shutdown()
+            if self.metrics_file:
+                metrics.write_metrics_file(self.metrics_file)
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Re-render profile PDFs when their JSON or photos change.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE)
+    parser.add_argument("--state", default=None, help="state file path")
+    parser.add_argument("--once", action="store_true", help="render outstanding changes and exit")
+    parser.add_argument("--metrics-file", default=None, help="write Prometheus metrics to this file")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on localhost")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.metrics_port is not None:
+        metrics.start_metrics_server(args.metrics_port)
+
+    FolderWatcher(
+        args.input_dir,
+        args.output_dir,
+        workers=args.workers,
+        poll_interval=args.interval,
+        debounce=args.debounce,
+        state_path=args.state,
+        metrics_file=args.metrics_file
+    ).run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+ZIP bundle export for CASER Profile Builder.
+Renders many profiles in parallel and streams each PDF into one archive.
+
+Usage:
+    python zip_export.py bundle.zip profile1.json profile2.json ...
+    python zip_export.py - profiles/*.json > bundle.zip
+"""
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import os
+import sys
+import time
+import zipfile
+import logging
+
+import metrics
+from pdf_generator import PDFGenerator, DEFAULT_CHUNK_SIZE
+from profile_io import load_profile, generate_filename
+from profile_model import Profile
+
+logger = logging.getLogger(__name__)
+
+
+def render_profile_entry(source):
+    """
+    Worker job: renders one profile to bytes.
+
+    Args:
+        source (str, Profile or dict): Profile JSON path or profile
+
+    Returns:
+        tuple: (archive file name, PDF bytes)
+    """
+    profile = load_profile(source) if isinstance(source, str) else Profile.coerce(source)
+    pdf = PDFGenerator.create_profile_pdf_bytes(profile)
+    return generate_filename(profile.full_name), pdf
+
+
+class ZipBundleExporter:
+    """Streams rendered profiles into a ZIP archive in completion order."""
+
+    def __init__(self, workers=None, max_in_flight=None,
+                 compression=zipfile.ZIP_STORED):
+        """
+        Args:
+            workers (int): Worker processes (default: CPU count)
+            max_in_flight (int): Jobs submitted but not yet written to the
+                archive (default: 2 per worker). Bounds memory use.
+            compression (int): zipfile compression; PDFs are already
+                compressed, so entries are stored by default
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.workers
+        self.compression = compression
+
+    def export(self, sources, output):
+        """
+        Renders sources and writes them into a ZIP archive.
+
+        Sources are consumed lazily and at most max_in_flight PDFs are held
+        in memory at once, so memory use does not grow with bundle size.
+        Output may be a non-seekable stream (pipe, HTTP response).
+
+        Args:
+            sources (iterable): Profile JSON paths, Profiles or profile dicts
+            output (str or file-like): Archive path or binary stream
+
+        Returns:
+            dict: {"written": [archive names], "failed": [(source, error)]}
+        """
+        result = {"written": [], "failed": []}
+        used_names = set()
+        sources = iter(sources)
+        pending = {}
+
+        with zipfile.ZipFile(output, "w", compression=self.compression) as archive, \
+                ProcessPoolExecutor(max_workers=self.workers) as executor:
+
+            def fill():
+                while len(pending) < self.max_in_flight:
+                    source = next(sources, None)
+                    if source is None:
+                        break
+                    future = executor.submit(metrics.run_measured, render_profile_entry, source)
+                    pending[future] = source
+                metrics.QUEUE_DEPTH.set(len(pending), pool="zip")
+
+            try:
+                fill()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        source = pending.pop(future)
+                        try:
+                            filename, pdf = metrics.unwrap_measured(future.result())
+                        except Exception as e:
+                            logger.error(f"Failed to render {self._label(source)}: {e}")
+                            result["failed"].append((self._label(source), str(e)))
+                            metrics.JOB_FAILURES.inc(pool="zip")
+                            continue
+                        name = self._unique_name(filename, used_names)
+                        self._write_entry(archive, name, pdf)
+                        result["written"].append(name)
+                    fill()
+            finally:
+                for future in pending:
+                    future.cancel()
+                metrics.QUEUE_DEPTH.set(0, pool="zip")
+
+        logger.info(
+            f"ZIP bundle done: {len(result['written'])} written, "
+            f"{len(result['failed'])} failed"
+        )
+        return result
+
+    def _write_entry(self, archive, name, pdf):
+        """Writes one PDF into archive in chunks."""
+        # archive.open(name) would date every entry 1980-01-01
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = self.compression
+        info.external_attr = 0o644 << 16
+        view = memoryview(pdf)
+        with archive.open(info, "w", force_zip64=len(pdf) > 0x7FFFFFFF) as entry:
+            for offset in range(0, len(view), DEFAULT_CHUNK_SIZE):
+                entry.write(view[offset:offset + DEFAULT_CHUNK_SIZE])
+
+    @staticmethod
+    def _unique_name(filename, used_names):
+        """Appends _2, _3... when several profiles share a file name."""
+        stem, ext = os.path.splitext(filename)
+        name = filename
+        counter = 2
+        while name in used_names:
+            name = f"{stem}_{counter}{ext}"
+            counter += 1
+        used_names.add(name)
+        return name
+
+    @staticmethod
+    def _label(source):
+        """Readable source name for logs and reports."""
+        if isinstance(source, str):
+            return source
+        name = source.get("full_name") if isinstance(source, dict) else source.full_name
+        return str(name or "<unnamed profile>")
+
+
+def export_zip_bundle(sources, output, workers=None):
+    """Simplified function for ZIP bundle export."""
+    return ZipBundleExporter(workers=workers).export(sources, output)
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Render profiles into one ZIP archive.")
+    parser.add_argument("output", help="archive path, or - for stdout")
+    parser.add_argument("profiles", nargs="+", help="profile JSON files")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-in-flight", type=int, default=None)
+    parser.add_argument("--metrics-file", default=None, help="write Prometheus metrics to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    output = sys.stdout.buffer if args.output == "-" else args.output
+    exporter = ZipBundleExporter(workers=args.workers, max_in_flight=args.max_in_flight)
+    result = exporter.export(args.profiles, output)
+    if args.metrics_file:
+        metrics.write_metrics_file(args.metrics_file)
+    if result["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()